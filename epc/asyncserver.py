@@ -0,0 +1,192 @@
+# Copyright (C) 2012-  Takafumi Arakaki
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+EPC server running on :mod:`asyncio` event loop (Python >= 3.4).
+"""
+
+import re
+import socket
+import asyncio
+import threading
+
+from .core import EPCCore
+from .server import EPCClientManager, EPCServer
+from .handler import EPCHandler, EPCCallManager, EPCClosed, encode_message
+
+
+_HEADER_RE = re.compile(br'[0-9a-fA-F]{6}\Z')
+# `int(head, 16)` alone also accepts sign, whitespace and underscore.
+
+
+class AsyncEPCHandler(EPCHandler, asyncio.Protocol):
+
+    """
+    :class:`EPCHandler` driven by :class:`asyncio.Protocol` callbacks.
+
+    Messages are handled in the event loop thread.  :meth:`call` and
+    :meth:`methods` can be used from any thread, but :meth:`call_sync`
+    and :meth:`methods_sync` must not be used in the event loop thread
+    as they block until the reply is processed by the loop.
+
+    """
+
+    # `BaseRequestHandler.__init__` handles the whole connection.
+    # Here, the event loop does it, so do not call it.
+
+    def __init__(self, server):
+        self.server = server
+        self.callmanager = EPCCallManager()
+        self._buffer = bytearray()
+        self._closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.request = self.connection = transport.get_extra_info('socket')
+        self.client_address = transport.get_extra_info('peername')
+        if self.disable_nagle_algorithm:
+            self.connection.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+        self._loop_thread = threading.current_thread()
+        self.server.add_client(self)
+
+    def connection_lost(self, exc):
+        # `transport.is_closing` is not available in Python < 3.5.1.
+        self._closed = True
+        self.server.remove_client(self)
+
+    def data_received(self, data):
+        buf = self._buffer
+        buf.extend(data)
+        end = len(buf)
+        pos = 0
+        # Copy each message out of the buffer only once, and shift
+        # the remaining bytes only once after all complete messages
+        # are handled.
+        with memoryview(buf) as view:
+            while end - pos >= 6:
+                head = bytes(view[pos:pos + 6])
+                if not _HEADER_RE.match(head):
+                    self.logger.error('Invalid message header: %r', head)
+                    self._closed = True
+                    self.transport.close()
+                    pos = end  # discard everything
+                    break
+                start = pos + 6
+                stop = start + int(head, 16)  # `_HEADER_RE` => stop >= start
+                if stop > end:
+                    break  # wait for the rest of the message
+                pos = stop
+                self._handle(bytes(view[start:stop]))
+        del buf[:pos]
+
+    def _send(self, *args):
+        string = encode_message(*args)
+        if self._closed:
+            raise EPCClosed
+        if threading.current_thread() is self._loop_thread:
+            self.transport.write(string)
+        else:
+            self.server.loop.call_soon_threadsafe(self.transport.write, string)
+
+
+class AsyncEPCServer(EPCClientManager, EPCCore):
+
+    """
+    EPC server using :mod:`asyncio` instead of :mod:`SocketServer`.
+
+    All connections are served by one event loop in one thread, so
+    the number of threads does not grow with the number of clients.
+    Published functions are called in the event loop thread; a slow
+    function blocks other clients.
+
+    It can be used like :class:`EPCServer <epc.server.EPCServer>`:
+
+    >>> server = AsyncEPCServer(('localhost', 0))
+    >>> def echo(*a):
+    ...     return a
+    >>> server.register_function(echo)                 #doctest: +ELLIPSIS
+    <function echo at 0x...>
+    >>> server.print_port()                                #doctest: +SKIP
+    9999
+    >>> server.serve_forever()                             #doctest: +SKIP
+    >>> server.server_close()
+
+    """
+
+    RequestHandlerClass = AsyncEPCHandler
+
+    allow_reuse_address = False
+    request_queue_size = 5
+
+    def __init__(self, server_address, debugger=None, log_traceback=False):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            if self.allow_reuse_address:
+                self.socket.setsockopt(
+                    socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(server_address)
+            self.socket.listen(self.request_queue_size)
+        except:
+            self.socket.close()
+            raise
+        self.server_address = self.socket.getsockname()
+        self.loop = asyncio.new_event_loop()
+        self._stopped = threading.Event()
+        EPCClientManager.__init__(self)
+        EPCCore.__init__(self, debugger, log_traceback)
+        # Start accepting here, so that `shutdown` called at any time
+        # only has to stop `loop.run_forever` in `serve_forever`.
+        self._server = self.loop.run_until_complete(
+            self.loop.create_server(
+                lambda: self.RequestHandlerClass(self), sock=self.socket))
+        self.logger.debug(
+            "AsyncEPCServer is initialized: server_address = %r",
+            self.server_address)
+
+    def serve_forever(self):
+        """
+        Accept connections and run the event loop until :meth:`shutdown`
+        is called.
+        """
+        self._stopped.clear()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._stopped.set()
+
+    def shutdown(self):
+        """
+        Stop :meth:`serve_forever` and wait until it returns.
+
+        This must be called from another thread than the one running
+        :meth:`serve_forever`.
+        """
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._stopped.wait()
+
+    def server_close(self):
+        """
+        Close the listening socket, client connections and event loop.
+        """
+        self._server.close()
+        self.socket.close()
+        for handler in list(self.clients):
+            handler.transport.close()
+        # Let transports call `connection_lost`:
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+    print_port = EPCServer.print_port
@@ -22,6 +22,10 @@ from .handler import ThreadingEPCHandler
 
 class EPCClientHandler(ThreadingEPCHandler):
 
+    disable_nagle_algorithm = False
+    # The socket may be given by user.  `TCP_NODELAY` is set in
+    # `EPCClient.connect` only when it creates the socket.
+
     # In BaseRequestHandler, everything happen in `.__init__()`.
     # Let's defer it to `.start()`.
 
@@ -108,6 +112,8 @@ class EPCClient(EPCCore):
         if isinstance(socket_or_address, tuple):
             import socket
             self.socket = socket.create_connection(socket_or_address)
+            self.socket.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         else:
             self.socket = socket_or_address
 
@@ -15,6 +15,7 @@
 
 
 import logging
+import threading
 from .py3compat import SimpleXMLRPCServer
 
 _logger = logging.getLogger(__name__)
@@ -30,6 +31,11 @@ class EPCDispatcher:
     def __init__(self):
         self.funcs = {}
         self.instance = None
+        self._methods_cache = None
+        self._methods_lock = threading.Lock()
+        # Reply to `methods` request.  It is built by the handler and
+        # cleared by `register_function`, both holding the lock so
+        # that a list built from old `funcs` is never stored.
 
     def register_instance(self, instance, allow_dotted_names=False):
         """
@@ -69,7 +75,9 @@ class EPCDispatcher:
         """
         if name is None:
             name = function.__name__
-        self.funcs[name] = function
+        with self._methods_lock:
+            self.funcs[name] = function
+            self._methods_cache = None
         return function
 
     def get_method(self, name):
@@ -14,6 +14,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import re
 import sys
 import itertools
 import threading
@@ -68,25 +69,125 @@ class EPCClosed(Exception):
 
 def encode_string(string):
     data = string.encode('utf-8')
-    datalen = '{0:06x}'.format(len(data) + 1).encode()
-    return _JOIN_BYTES([datalen, data, _NEWLINE_BYTE])
-_JOIN_BYTES = ''.encode().join
+    return ('%06x' % (len(data) + 1)).encode() + data + _NEWLINE_BYTE
 _NEWLINE_BYTE = '\n'.encode()
 
 
 def encode_object(obj, **kwds):
-    return encode_string(dumps(obj, **kwds))
+    if kwds:
+        return encode_string(dumps(obj, **kwds))
+    return encode_string(_tosexp(obj))
 
 
 def encode_message(name, *args, **kwds):
-    return encode_object([Symbol(name)] + list(args), **kwds)
+    try:
+        symbol = _MESSAGE_SYMBOLS[name]
+    except KeyError:
+        symbol = Symbol(name)
+    return encode_object([symbol] + list(args), **kwds)
+_MESSAGE_SYMBOLS = dict(
+    (name, Symbol(name)) for name in [
+        'call', 'methods', 'return', 'return-error', 'epc-error'])
 
 
 def unpack_message(bytes):
-    data = loads(bytes.decode('utf-8'))
+    data = _loads(bytes.decode('utf-8'))
     return (data[0].value(), data[1], data[2:])
 
 
+_TOKEN_RE = re.compile(r'''
+  [ \t\n\r\x0b\x0c]+
+| (?P<open>\()
+| (?P<close>\))
+| "(?P<str>[^"\\]*)"
+| (?P<int>[-+]?\d+)(?=[ \t\n\r\x0b\x0c()"]|$)
+| (?P<sym>[^\W\d][-.\w]*)(?=[ \t\n\r\x0b\x0c()"]|$)
+''', re.VERBOSE | re.UNICODE)
+_FLOAT_SYMBOLS = frozenset(['inf', 'nan', 'infinity'])
+
+
+def _loads(string):
+    """
+    Same as `sexpdata.loads`, but faster for typical EPC messages.
+
+    Only lists, integers, symbols and strings without escape are
+    handled here.  Anything else is parsed by `sexpdata.loads`, which
+    also reports errors for invalid S-expressions.
+
+    >>> _loads('(call 1 echo (55 "str" nil t))')
+    [Symbol('call'), 1, Symbol('echo'), [55, 'str', [], True]]
+
+    """
+    match = _TOKEN_RE.match
+    stack = []
+    sexp = top = []
+    pos = 0
+    end = len(string)
+    while pos < end:
+        m = match(string, pos)
+        if m is None:
+            return loads(string)
+        pos = m.end()
+        kind = m.lastgroup
+        if kind is None:  # whitespace
+            continue
+        elif kind == 'open':
+            stack.append(sexp)
+            sexp = []
+        elif kind == 'close':
+            if not stack:
+                return loads(string)
+            child = sexp
+            sexp = stack.pop()
+            sexp.append(child)
+        elif kind == 'str':
+            sexp.append(m.group(kind))
+        elif kind == 'int':
+            sexp.append(int(m.group(kind)))
+        else:
+            token = m.group(kind)
+            if token == 'nil':
+                sexp.append([])
+            elif token == 't':
+                sexp.append(True)
+            elif token.lower() in _FLOAT_SYMBOLS:
+                return loads(string)
+            else:
+                sexp.append(Symbol(token))
+    if stack or len(top) != 1:
+        return loads(string)
+    return top[0]
+
+
+def _tosexp(obj):
+    """
+    Same as `sexpdata.dumps`, but faster for built-in types.
+
+    Objects other than list, tuple, str, int, float, bool and None
+    (including their subclasses) are converted by `sexpdata.dumps`.
+
+    >>> _tosexp([Symbol('return'), 1, ['a"b', 1.5, None, True]])
+    '(return 1 ("a\\\\"b" 1.5 () t))'
+
+    """
+    cls = type(obj)
+    if cls is list or cls is tuple:
+        return '(' + ' '.join(map(_tosexp, obj)) + ')'
+    elif cls is _TEXT_TYPE:
+        return '"' + obj.translate(_STRING_QUOTES) + '"'
+    elif cls is int or cls is float:
+        return str(obj)
+    elif obj is None or obj is False:
+        return '()'
+    elif obj is True:
+        return 't'
+    return dumps(obj)
+_TEXT_TYPE = type(u'')
+_STRING_QUOTES = dict((ord(s), q) for (s, q) in [
+    ('\\', '\\\\'), ('"', '\\"'), ('\b', '\\b'), ('\f', '\\f'),
+    ('\n', '\\n'), ('\r', '\\r'), ('\t', '\\t')])
+
+
 def itermessage(read):
     while True:
         head = read(6)
@@ -102,6 +203,8 @@ def itermessage(read):
 
 class BlockingCallback(object):
 
+    __slots__ = ('queue', 'callback', 'errback', 'cbs')
+
     def __init__(self):
         self.queue = q = Queue.Queue()
         self.callback = lambda x: q.put(('return', x))
@@ -116,7 +219,9 @@ class BlockingCallback(object):
             raise reply
 
 
-class EPCCallManager:
+class EPCCallManager(object):
+
+    __slots__ = ('callbacks', 'get_uid')
 
     Dict = LockingDict  # FIXME: make it configurable from server class.
     """
@@ -180,6 +285,15 @@ class EPCHandler(SocketServer.StreamRequestHandler):
     # self.rfile      : stream from client
     # self.wfile      : stream to client
 
+    rbufsize = 64 * 1024
+    # Read buffer size for `self.rfile`.  Length header and body of a
+    # message (and often several messages) are read from the socket
+    # by a single `recv` call as long as they fit in this buffer.
+
+    disable_nagle_algorithm = True
+    # Set `TCP_NODELAY` in `StreamRequestHandler.setup`, as EPC messages
+    # are small and should be sent without waiting for more data.
+
     @property
     def logger(self):
         return self.server.logger
@@ -210,12 +324,10 @@ class EPCHandler(SocketServer.StreamRequestHandler):
                 raise  # if not, just re-raise it.
 
     def _recv(self):
-        self.logger.debug('receiving...')
+        logger = self.logger
         for data in itermessage(self._rfile_read_safely):
-            self.logger.debug(
-                'received: length = %r; data = %r', len(data), data)
+            logger.debug('received: length = %r', len(data))
             yield data
-            self.logger.debug('receiving...')
 
     @autolog('debug')
     def _send(self, *args):
@@ -228,18 +340,38 @@ class EPCHandler(SocketServer.StreamRequestHandler):
 
     @autolog('debug')
     def handle(self):
+        handle = self._handle
         for sexp in self._recv():
-            self._handle(sexp)
+            handle(sexp)
+
+    _message_methods = dict(
+        (name, ('_validate_' + pyname, '_handle_' + pyname))
+        for (name, pyname) in [
+            ('call', 'call'),
+            ('methods', 'methods'),
+            ('return', 'return'),
+            ('return-error', 'return_error'),
+            ('epc-error', 'epc_error'),
+        ])
+    # Map message name to names of validator and handler methods.
+    # Other messages are dispatched to `_validate_<name>` and
+    # `_handle_<name>` (`-` replaced by `_`), if defined.
 
     @autolog('debug')
     def _handle(self, sexp):
         uid = undefined = []  # default: nil
         try:
             (name, uid, args) = unpack_message(sexp)
-            pyname = name.replace('-', '_')
-            getattr(self, '_validate_{0}'.format(pyname))(uid, args)
-            handler = getattr(self, '_handle_{0}'.format(pyname))
-            reply = handler(uid, *args)
+            try:
+                (validator, handler) = self._message_methods[name]
+            except KeyError:
+                pyname = name.replace('-', '_')
+                validator = '_validate_' + pyname
+                handler = '_handle_' + pyname
+                if not hasattr(self, validator):
+                    raise ValueError('Unknown message: {0}'.format(name))
+            getattr(self, validator)(uid, args)
+            reply = getattr(self, handler)(uid, *args)
             if reply is not None:
                 self._send(*reply)
         except Exception as err:
@@ -277,11 +409,18 @@ class EPCHandler(SocketServer.StreamRequestHandler):
         return ['return', uid, result]
 
     def _handle_methods(self, uid):
-        return ['return', uid, [
-            (Symbol(name), [], String(func.__doc__ or ""))
-            # FIXNE: implement arg-specs
-            for (name, func)
-            in self.server.funcs.items()]]
+        server = self.server
+        methods = server._methods_cache
+        if methods is None:
+            with server._methods_lock:
+                methods = server._methods_cache
+                if methods is None:
+                    methods = server._methods_cache = [
+                        (Symbol(name), [], String(func.__doc__ or ""))
+                        # FIXNE: implement arg-specs
+                        for (name, func)
+                        in server.funcs.items()]
+        return ['return', uid, methods]
 
     def _handle_return(self, uid, reply):
         self.callmanager.handle_return(uid, reply)
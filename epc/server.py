@@ -15,21 +15,65 @@
 
 
 import sys
+import socket
 import logging
+import logging.handlers
+import threading
+from collections import OrderedDict
 
-from .py3compat import SocketServer
-from .utils import autolog, deprecated
+from .py3compat import SocketServer, Queue
+from .utils import autolog, deprecated, newthread
 from .core import EPCCore
 from .handler import EPCHandler, ThreadingEPCHandler
 
 
+if hasattr(logging.handlers, 'QueueHandler'):  # Python >= 3.2
+
+    class _QueueFileHandler(logging.handlers.QueueHandler):
+
+        """
+        Pass records to `target` handler in a `QueueListener` thread.
+        Closing this handler stops the thread and closes `target`.
+        """
+
+        def __init__(self, target):
+            logging.handlers.QueueHandler.__init__(self, Queue.Queue())
+            self.target = target
+            self.listener = logging.handlers.QueueListener(self.queue, target)
+            self.listener.start()
+
+        def close(self):
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+                self.target.close()
+            logging.handlers.QueueHandler.close(self)
+
+
 @deprecated
 def setuplogfile(logger=None, filename='python-epc.log'):
+    """
+    Write records of `logger` to `filename`.
+
+    Records are put in a queue and written to the file by a background
+    thread (Python >= 3.2), so the logging thread does not wait for
+    disk writes.  Records still in the queue when the process is
+    killed (e.g., by Emacs) are lost.
+
+    Return the handler added to `logger`.  To stop writing, remove it
+    from `logger` and close it.  Otherwise, it is closed at exit.
+
+    """
     if logger is None:
         from .core import _logger as logger
-    ch = logging.FileHandler(filename=filename, mode='w')
+    fh = logging.FileHandler(filename=filename, mode='w')
+    if hasattr(logging.handlers, 'QueueHandler'):
+        ch = _QueueFileHandler(fh)
+    else:                       # Python 2
+        ch = fh
     ch.setLevel(logging.DEBUG)
     logger.addHandler(ch)
+    return ch
 
 
 class EPCClientManager:
@@ -38,17 +82,29 @@ class EPCClientManager:
     # which is an old style class.
 
     def __init__(self):
-        self.clients = []
+        # Connected handlers are stored as keys of an ordered dict, so
+        # that removing one does not scan all the others.
+        self._clients = OrderedDict()
+        self._clients_lock = threading.Lock()
+
+    @property
+    def clients(self):
         """
         A list of :class:`EPCHandler` object for connected clients.
+
+        This is a snapshot; modifying it does not affect the server.
         """
+        with self._clients_lock:
+            return list(self._clients)
 
     def add_client(self, handler):
-        self.clients.append(handler)
+        with self._clients_lock:
+            self._clients[handler] = None
         self.handle_client_connect(handler)
 
     def remove_client(self, handler):
-        self.clients.remove(handler)
+        with self._clients_lock:
+            del self._clients[handler]
         self.handle_client_disconnect(handler)
 
     def handle_client_connect(self, handler):
@@ -109,6 +165,13 @@ class EPCServer(SocketServer.TCPServer, EPCClientManager,
 
     """
 
+    allow_reuse_port = False
+    """
+    Set `SO_REUSEPORT` option of the listening socket, so that several
+    server processes can listen on the same port.  It has no effect on
+    platforms without `SO_REUSEPORT`.
+    """
+
     def __init__(self, server_address,
                  RequestHandlerClass=EPCHandler,
                  bind_and_activate=True,
@@ -126,14 +189,18 @@ class EPCServer(SocketServer.TCPServer, EPCClientManager,
             "EPCServer is initialized: server_address = %r",
             self.server_address)
 
+    def server_bind(self):
+        # `TCPServer` supports `allow_reuse_port` only in Python >= 3.11
+        if self.allow_reuse_port and hasattr(socket, 'SO_REUSEPORT'):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        SocketServer.TCPServer.server_bind(self)
+
     @autolog('debug')
     def handle_error(self, request, client_address):
-        self.logger.error('handle_error: trying to get traceback.format_exc')
-        try:
-            import traceback
-            self.logger.error('handle_error: \n%s', traceback.format_exc())
-        except:
-            self.logger.error('handle_error: OOPS')
+        # Traceback is formatted by the logging handler, only when
+        # the record is emitted.
+        self.logger.exception('handle_error: client_address = %r',
+                              client_address)
 
     def print_port(self, stream=sys.stdout):
         """
@@ -171,6 +238,99 @@ class ThreadingEPCServer(SocketServer.ThreadingMixIn, EPCServer):
         EPCServer.__init__(self, *args, **kwds)
 
 
+class ThreadPoolMixIn:
+
+    """
+    Mix-in class to handle each connection in a fixed set of threads.
+
+    Unlike :class:`SocketServer.ThreadingMixIn`, the number of threads
+    does not grow with the number of connections.  When all workers are
+    busy, new connections wait in a queue until a worker is freed.
+
+    """
+
+    max_workers = None
+    """
+    Number of worker threads.  Default (None) means twice the number
+    of CPUs.
+    """
+
+    def start_workers(self):
+        if self.max_workers is None:
+            import multiprocessing
+            self.max_workers = multiprocessing.cpu_count() * 2
+        self._request_queue = Queue.Queue()
+        self._workers = []
+        for _ in range(self.max_workers):
+            thread = newthread(self, target=self._process_request_worker)
+            thread.daemon = True
+            thread.start()
+            self._workers.append(thread)
+
+    def _process_request_worker(self):
+        while True:
+            item = self._request_queue.get()
+            if item is None:
+                return
+            (request, client_address) = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self._request_queue.put((request, client_address))
+
+    def stop_workers(self):
+        """
+        Ask worker threads to exit, without waiting for them.
+
+        A worker exits after it finishes the connection it is handling,
+        i.e., when the client closes it.  Workers are daemon threads, so
+        they do not prevent the interpreter from exiting.
+        """
+        for _ in self._workers:
+            self._request_queue.put(None)
+
+
+class PooledEPCServer(ThreadPoolMixIn, EPCServer):
+
+    """
+    Class :class:`EPCServer` mixed with :class:`ThreadPoolMixIn`.
+
+    Use this class instead of :class:`ThreadingEPCServer` when the
+    number of threads must be bounded.  As each connection occupies
+    one worker until it is closed, at most `max_workers` clients are
+    served at the same time.
+
+    >>> server = PooledEPCServer(('localhost', 0), max_workers=4)
+    >>> server.max_workers
+    4
+    >>> server.server_close()
+
+    """
+
+    def __init__(self, *args, **kwds):
+        max_workers = kwds.pop('max_workers', None)
+        if max_workers is not None:
+            self.max_workers = max_workers
+        EPCServer.__init__(self, *args, **kwds)
+        self.start_workers()
+
+    def server_close(self):
+        """
+        Close the listening socket and stop the workers.
+
+        Connections being handled are not closed, and workers serving
+        them keep running until the clients disconnect.  See
+        :meth:`ThreadPoolMixIn.stop_workers`.
+        """
+        EPCServer.server_close(self)
+        self.stop_workers()
+
+
 def main(args=None):
     """
     Quick CLI to serve Python functions in a module.
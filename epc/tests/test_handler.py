@@ -0,0 +1,78 @@
+# Copyright (C) 2012-  Takafumi Arakaki
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+
+from sexpdata import loads, dumps, Symbol, String
+
+from ..handler import _loads, _tosexp
+from ..py3compat import utf8
+from .utils import BaseTestCase
+
+
+class TestLoads(BaseTestCase):
+
+    def check_same_as_sexpdata(self, string):
+        try:
+            desired = loads(string)
+        except Exception as err:
+            self.assertRaises(type(err), _loads, string)
+        else:
+            actual = _loads(string)
+            self.assertEqual(actual, desired)
+            self.assertEqual(type(actual), type(desired))
+
+    def test_call(self):
+        self.check_same_as_sexpdata('(call 1 echo (55 "str" (1 -2 +3)))')
+
+    def test_nil_and_t(self):
+        self.check_same_as_sexpdata('(return 1 (nil t () nils tt))')
+
+    def test_whitespace(self):
+        self.check_same_as_sexpdata('\n ( methods\t2 ) \n')
+
+    def test_unicode(self):
+        self.check_same_as_sexpdata(utf8('(call 1 echo ("日本語" 日本語))'))
+
+    def test_dotted_names(self):
+        self.check_same_as_sexpdata('(call 1 path.join ("a" "b"))')
+
+    def test_fallback(self):
+        self.check_same_as_sexpdata('(a 1.5 1e3 inf -Infinity)')
+        self.check_same_as_sexpdata('(a "escaped \\" \\n string")')
+        self.check_same_as_sexpdata("(a 'quoted (b . c) ?x :key [1 2])")
+        self.check_same_as_sexpdata('(a ; comment\n b)')
+
+    def test_invalid(self):
+        self.check_same_as_sexpdata('(((invalid sexp!')
+        self.check_same_as_sexpdata('(a))')
+        self.check_same_as_sexpdata('(a) (b)')
+
+
+class TestToSExp(BaseTestCase):
+
+    def check_same_as_sexpdata(self, obj):
+        self.assertEqual(_tosexp(obj), dumps(obj))
+
+    def test_builtin_types(self):
+        self.check_same_as_sexpdata(
+            [1, -2, 1.5, None, True, False, (), [], ('a', ['b'])])
+
+    def test_string_quotes(self):
+        self.check_same_as_sexpdata(['"', '\\', '\b\f\n\r\t', utf8('日本語')])
+
+    def test_fallback(self):
+        self.check_same_as_sexpdata(
+            [Symbol('return'), Symbol('a b'), String('s'), {'k': 1}])
@@ -16,18 +16,25 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
+import time
 import socket
+import threading
 
 from sexpdata import Symbol, loads
 
-from ..server import ThreadingEPCServer
+from ..server import ThreadingEPCServer, PooledEPCServer, setuplogfile
+try:
+    from ..asyncserver import AsyncEPCServer
+except ImportError:
+    AsyncEPCServer = None
 from ..utils import newthread
 from ..handler import encode_string, encode_object, BlockingCallback, \
     ReturnError, EPCError, ReturnErrorCallerUnknown, EPCErrorCallerUnknown, \
     CallerUnknown
 from ..py3compat import utf8, Queue, nested
 from .utils import mockedattr, logging_to_stdout, CaptureStdIO, BaseTestCase, \
-    streamio
+    streamio, unittest
 
 
 class TestEPCServerMisc(BaseTestCase):
@@ -53,13 +60,65 @@ class TestEPCServerMisc(BaseTestCase):
         self.assertEqual(stream.getvalue(),
                          '{0}\n'.format(self.server.server_address[1]))
 
+    def test_handle_error_logs_traceback(self):
+        with CaptureStdIO() as stdio:
+            with logging_to_stdout(self.server.logger):
+                try:
+                    raise ValueError('error in request')
+                except ValueError:
+                    self.server.handle_error(None, ('localhost', 0))
+        log = stdio.read_stdout()
+        self.assertIn('ValueError: error in request', log)
+        self.assertIn("raise ValueError('error in request')", log)
+
+    @unittest.skipIf(not hasattr(socket, 'SO_REUSEPORT'),
+                     'SO_REUSEPORT is not available')
+    def test_allow_reuse_port(self):
+        class ReusePortEPCServer(ThreadingEPCServer):
+            allow_reuse_port = True
+        server = ReusePortEPCServer(('localhost', 0))
+        self.addCleanup(server.server_close)
+        self.assertTrue(server.socket.getsockopt(
+            socket.SOL_SOCKET, socket.SO_REUSEPORT))
+        self.assertFalse(self.server.socket.getsockopt(
+            socket.SOL_SOCKET, socket.SO_REUSEPORT))
+
+    def test_setuplogfile_writes_promptly(self):
+        import logging
+        import shutil
+        import tempfile
+        import warnings
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        filename = os.path.join(tmpdir, 'python-epc.log')
+        logger = logging.getLogger('epc.tests.setuplogfile')
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', DeprecationWarning)
+            handler = setuplogfile(logger, filename)
+        self.addCleanup(handler.close)
+        self.addCleanup(logger.removeHandler, handler)
+        logger.debug('message to be written')
+        # The record must reach the file without waiting for the
+        # interpreter exit (Emacs may kill the process).
+        for _ in range(100):
+            with open(filename) as f:
+                if 'message to be written' in f.read():
+                    break
+            time.sleep(0.01)
+        else:
+            self.fail('record is not written to {0}'.format(filename))
+
 
 class BaseEPCServerTestCase(BaseTestCase):
 
+    server_class = ThreadingEPCServer
+
     def setUp(self):
         # See: http://stackoverflow.com/questions/7720953
-        ThreadingEPCServer.allow_reuse_address = True
-        self.server = ThreadingEPCServer(('localhost', 0))
+        self.server_class.allow_reuse_address = True
+        self.server = self.server_class(('localhost', 0))
         self.server_thread = newthread(self, target=self.server.serve_forever)
         self.server_thread.start()
 
@@ -107,6 +166,35 @@ class TestEPCServerRequestHandling(BaseEPCServerTestCase):
     def test_echo(self):
         self.check_echo()
 
+    def test_multiple_messages_in_one_packet(self):
+        self.client.send(encode_string('(call 1 echo (55))') +
+                         encode_string('(call 2 echo (66))'))
+        replies = [encode_string('(return 1 (55))'),
+                   encode_string('(return 2 (66))')]
+        result = ''.encode()
+        while len(result) < sum(map(len, replies)):
+            result += self.client.recv(1024)
+        # Messages may be handled in parallel, so the order of the
+        # replies is not guaranteed.
+        self.assertIn(result, [replies[0] + replies[1],
+                               replies[1] + replies[0]])
+
+    def test_message_split_into_packets(self):
+        message = encode_string('(call 1 echo (55))')
+        self.client.send(message[:3])
+        time.sleep(0.01)
+        self.client.send(message[3:10])
+        time.sleep(0.01)
+        self.client.send(message[10:])
+        result = self.client.recv(1024)
+        self.assertEqual(encode_string('(return 1 (55))'), result)
+
+    def test_nagle_algorithm_disabled(self):
+        self.check_echo()  # to fetch handler
+        connection = self.server.clients[0].connection
+        self.assertTrue(connection.getsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
     def test_error_in_method(self):
         with logging_to_stdout(self.server.logger):
             self.client_send('(call 2 bad_method nil)')
@@ -137,6 +225,63 @@ class TestEPCServerRequestHandling(BaseEPCServerTestCase):
             (n, f.__doc__) for (n, f) in self.server.funcs.items())
         self.assertEqual(actual_docs, desired_docs)
 
+    def test_methods_after_register_function(self):
+        self.client_send('(methods 4)')
+        self.receive_message()
+
+        def new_method():
+            pass
+        self.server.register_function(new_method)
+        self.client_send('(methods 5)')
+        reply = self.receive_message()
+        self.assertEqual(set(m[0].value() for m in reply[2]),
+                         set(['echo', 'bad_method', 'new_method']))
+
+    def test_register_function_while_building_methods(self):
+        server = self.server
+
+        def new_method():
+            pass
+        register = newthread(self, target=server.register_function,
+                             args=(new_method,))
+
+        class Funcs(dict):
+            def items(self):
+                items = list(dict.items(self))
+                # Register a function after the reply is built from
+                # `items` but before it is stored in the cache.
+                if register.ident is None:  # not started yet
+                    register.start()
+                    register.join(0.1)
+                return items
+        server.funcs = Funcs(server.funcs)
+
+        self.client_send('(methods 4)')
+        self.receive_message()
+        register.join()
+        self.client_send('(methods 5)')
+        reply = self.receive_message()
+        self.assertEqual(set(m[0].value() for m in reply[2]),
+                         set(['echo', 'bad_method', 'new_method']))
+
+    def test_unknown_message(self):
+        with logging_to_stdout(self.server.logger):
+            self.client_send('(no-such-message 6)')
+            reply = self.receive_message()
+        self.assertEqual(reply[0], Symbol('return-error'))
+        self.assertEqual(reply[1], 6)
+        self.assertIn('no-such-message', reply[2])
+
+    def test_message_defined_in_handler(self):
+        self.check_echo()  # to establish connection to client
+        handler = self.server.clients[0]
+        # Messages not in `_message_methods` are dispatched by name:
+        handler._validate_ping_pong = lambda uid, args: None
+        handler._handle_ping_pong = lambda uid, *args: ['return', uid, args]
+        self.client_send('(ping-pong 7 "ping")')
+        reply = self.receive_message()
+        self.assertEqual(reply, [Symbol('return'), 7, ['ping']])
+
     def test_unicode_message(self):
         s = "日本語能力!!ソﾊﾝｶｸ"
         self.client_send(utf8('(call 1 echo ("{0}"))'.format(s)))
@@ -222,6 +367,103 @@ class TestEPCServerRequestHandling(BaseEPCServerTestCase):
         self.assertIn('raise self.error_to_throw', log)
 
 
+class TestPooledEPCServerRequestHandling(TestEPCServerRequestHandling):
+
+    server_class = PooledEPCServer
+
+    def test_bounded_number_of_workers(self):
+        server = PooledEPCServer(('localhost', 0), max_workers=1)
+        server.register_function(lambda *a: a, 'echo')
+        server_thread = newthread(self, target=server.serve_forever)
+        server_thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        nthreads = threading.active_count()
+
+        call = encode_string('(call 1 echo (55))')
+        reply = encode_string('(return 1 (55))')
+        first = socket.create_connection(server.server_address)
+        self.addCleanup(first.close)
+        second = socket.create_connection(server.server_address)
+        self.addCleanup(second.close)
+        first.settimeout(self.timeout)
+        first.send(call)
+        self.assertEqual(first.recv(1024), reply)
+
+        # The only worker is busy with `first`, so `second` waits:
+        second.send(call)
+        second.settimeout(0.2)
+        self.assertRaises(socket.timeout, second.recv, 1024)
+        self.assertEqual(threading.active_count(), nthreads)
+
+        first.close()
+        second.settimeout(self.timeout)
+        self.assertEqual(second.recv(1024), reply)
+        self.assertEqual(threading.active_count(), nthreads)
+
+
+@unittest.skipIf(AsyncEPCServer is None, 'asyncio is not available')
+class TestAsyncEPCServerRequestHandling(TestEPCServerRequestHandling):
+
+    server_class = AsyncEPCServer
+
+    def check_invalid_header(self, data):
+        bad_client = socket.create_connection(self.server.server_address)
+        try:
+            with logging_to_stdout(self.server.logger):
+                bad_client.send(data)
+                # The server must close the bad connection and keep
+                # serving other clients.
+                bad_client.settimeout(self.timeout)
+                self.assertEqual(bad_client.recv(1024), ''.encode())
+            self.check_echo()
+        finally:
+            bad_client.close()
+
+    def test_negative_length_header(self):
+        self.check_invalid_header('-00006'.encode())
+
+    def test_non_hex_header(self):
+        self.check_invalid_header(' 0x06 '.encode())
+
+    def test_negative_length_header_after_message(self):
+        self.client.send(encode_string('(call 1 echo (55))') +
+                         '-00006(call 2 echo (66))'.encode())
+        with logging_to_stdout(self.server.logger):
+            result = ''.encode()
+            while True:
+                data = self.client.recv(1024)
+                if not data:
+                    break
+                result += data
+        # The message before the invalid header is still handled:
+        self.assertEqual(result, encode_string('(return 1 (55))'))
+        # and the server keeps serving other clients:
+        self.client = socket.create_connection(self.server.server_address)
+        self.client.settimeout(self.timeout)
+        self.check_echo()
+
+    def test_shutdown_immediately_after_start(self):
+        # `shutdown` may be called before `serve_forever` starts the
+        # event loop.  Repeat to make the race likely to happen.
+        for _ in range(10):
+            server = self.server_class(('localhost', 0))
+            errors = []
+
+            def serve():
+                try:
+                    server.serve_forever()
+                except Exception as err:
+                    errors.append(err)
+            thread = newthread(self, target=serve)
+            thread.start()
+            server.shutdown()
+            thread.join(self.timeout)
+            server.server_close()
+            self.assertFalse(thread.is_alive())
+            self.assertEqual(errors, [])
+
+
 class TestEPCServerCallClient(BaseEPCServerTestCase):
 
     def setUp(self):
@@ -321,3 +563,9 @@ class TestEPCServerCallClient(BaseEPCServerTestCase):
     def test_invalid_epc_error_too_many_arguments(self):
         self.check_invalid_reply(
             '(epc-error {0} "value" "extra" "value")'.format)
+
+
+@unittest.skipIf(AsyncEPCServer is None, 'asyncio is not available')
+class TestAsyncEPCServerCallClient(TestEPCServerCallClient):
+
+    server_class = AsyncEPCServer
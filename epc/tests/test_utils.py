@@ -14,7 +14,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from ..utils import ThreadedIterator, LockingDict
+import logging
+
+from ..utils import ThreadedIterator, LockingDict, autolog
 
 from .utils import BaseTestCase
 
@@ -61,3 +63,24 @@ class TestLockingDict(BaseTestCase):
         self.assertEqual(ld.pop('a'), 1)
         self.assertEqual(ld.pop('b'), 2)
         self.assertEqual(dict(**self.ld), dict(c=3))
+
+
+class TestAutoLog(BaseTestCase):
+
+    class Loud(object):
+
+        def __repr__(self):
+            raise AssertionError('repr should not be called')
+
+    def test_no_formatting_when_disabled(self):
+        logger = logging.getLogger('epc.tests.autolog')
+        logger.setLevel(logging.INFO)
+
+        class Dummy(object):
+            @autolog('debug')
+            def method(self, arg):
+                return arg
+
+        Dummy.logger = logger
+        loud = self.Loud()
+        self.assertIs(Dummy().method(loud), loud)
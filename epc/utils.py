@@ -45,6 +45,10 @@ def autolog(level):
     def wrapper(method):
         @functools.wraps(method)
         def new_method(self, *args, **kwds):
+            # Formatting arguments can be expensive (e.g., large
+            # payload), so do nothing unless the log is actually emitted.
+            if not self.logger.isEnabledFor(level):
+                return method(self, *args, **kwds)
             funcname = ".".join([self.__class__.__name__, method.__name__])
             self.logger.log(level, "(AutoLog) Called: %s",
                             func_call_as_str(funcname, *args, **kwds))